@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2025-09-20 10:00
+
+import re
+
+from django.db import migrations, models
+
+
+# 迁移中固定一份分类规则，不依赖 models 中可能变化的实现
+_PATH_CATEGORY_RE = re.compile(r'(documents|images|downloads|desktop)', re.IGNORECASE)
+
+
+def classify_path(path):
+    """根据路径返回分类"""
+    match = _PATH_CATEGORY_RE.search(path or '')
+    return match.group(1).lower() if match else 'other'
+
+
+def populate_path_category(apps, schema_editor):
+    """为已有记录回填路径分类"""
+    FileSaveHistory = apps.get_model('file_history', 'FileSaveHistory')
+    records = list(FileSaveHistory.objects.only('id', 'final_path'))
+    for record in records:
+        record.path_category = classify_path(record.final_path)
+    FileSaveHistory.objects.bulk_update(records, ['path_category'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_history', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filesavehistory',
+            name='path_category',
+            field=models.CharField(default='other', editable=False, max_length=20, verbose_name='路径分类'),
+        ),
+        migrations.RunPython(populate_path_category, migrations.RunPython.noop),
+    ]
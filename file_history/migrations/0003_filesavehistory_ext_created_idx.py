@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2025-09-20 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_history', '0002_filesavehistory_path_category'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filesavehistory',
+            index=models.Index(fields=['file_extension', '-created_at'], name='save_histor_file_ex_1c1426_idx'),
+        ),
+    ]
@@ -1,7 +1,19 @@
+import re
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+# 路径分类关键词，一次正则扫描完成匹配
+_PATH_CATEGORY_RE = re.compile(r'(documents|images|downloads|desktop)', re.IGNORECASE)
+
+
+def classify_path(path):
+    """根据路径返回分类"""
+    match = _PATH_CATEGORY_RE.search(path or '')
+    return match.group(1).lower() if match else 'other'
+
+
 class FileSaveHistory(models.Model):
     """文件保存历史记录模型"""
     original_filename = models.CharField(max_length=255, verbose_name="原始文件名")
@@ -11,6 +23,7 @@ class FileSaveHistory(models.Model):
     file_extension = models.CharField(max_length=20, blank=True, verbose_name="文件扩展名")
     content_preview = models.TextField(blank=True, verbose_name="内容预览")
     save_mode = models.CharField(max_length=50, default="manual", verbose_name="保存模式")
+    path_category = models.CharField(max_length=20, default='other', editable=False, verbose_name="路径分类")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
@@ -19,10 +32,23 @@ class FileSaveHistory(models.Model):
         ordering = ['-created_at']
         verbose_name = "文件保存历史"
         verbose_name_plural = "文件保存历史"
+        indexes = [
+            models.Index(fields=['file_extension', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.original_filename} -> {self.final_path}"
     
+    def save(self, *args, **kwargs):
+        """保存时补全文件扩展名并根据最终路径计算分类"""
+        if not self.file_extension and '.' in self.original_filename:
+            self.file_extension = self.original_filename.rpartition('.')[2].lower()
+        self.path_category = classify_path(self.final_path)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'final_path' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'path_category'}
+        super().save(*args, **kwargs)
+    
     @property
     def file_size_mb(self):
         """返回文件大小(MB)"""
@@ -36,17 +62,3 @@ class FileSaveHistory(models.Model):
         from django.utils import timezone
         from datetime import timedelta
         return self.created_at > timezone.now() - timedelta(hours=24)
-    
-    @property
-    def path_category(self):
-        """根据路径返回分类"""
-        if 'documents' in self.final_path.lower():
-            return 'documents'
-        elif 'images' in self.final_path.lower():
-            return 'images'
-        elif 'downloads' in self.final_path.lower():
-            return 'downloads'
-        elif 'desktop' in self.final_path.lower():
-            return 'desktop'
-        else:
-            return 'other'
\ No newline at end of file
@@ -0,0 +1,43 @@
+import datetime
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时回退到DRF默认的json实现
+    orjson = None
+
+
+def _orjson_default(obj):
+    """
+    处理orjson不能直接序列化的对象
+    
+    datetime 按DRF JSONEncoder的格式输出：UTC写作Z，微秒截断为毫秒
+    """
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if representation.endswith('+00:00'):
+            representation = representation[:-6] + 'Z'
+        if obj.microsecond:
+            representation = representation[:23] + representation[26:]
+        return representation
+    return str(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """基于orjson的JSON渲染器，未安装orjson时使用标准库json"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        return orjson.dumps(
+            data,
+            default=_orjson_default,
+            # datetime 交给 _orjson_default 按DRF的格式输出；
+            # 不加 OPT_NAIVE_UTC：USE_TZ=False 时的无时区时间是本地时间，原样输出
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
@@ -34,16 +34,6 @@ class FileSaveHistoryCreateSerializer(serializers.ModelSerializer):
             'original_filename', 'original_path', 'final_path',
             'file_size', 'file_extension', 'content_preview', 'save_mode'
         ]
-    
-    def create(self, validated_data):
-        """创建历史记录"""
-        # 自动设置文件扩展名
-        if not validated_data.get('file_extension'):
-            filename = validated_data.get('original_filename', '')
-            if '.' in filename:
-                validated_data['file_extension'] = filename.split('.')[-1].lower()
-        
-        return super().create(validated_data)
 
 
 class FileSaveHistoryListSerializer(serializers.ModelSerializer):
@@ -1,11 +1,64 @@
-from typing import Dict, Any, List, Optional
-from django.db.models import Q, Count, Sum, Avg
+from collections import Counter
+from typing import Dict, Any, List, Optional, Union
+from django.conf import settings
+from django.db.models import Q, Count, Sum, Avg, Max
 from django.utils import timezone
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, date, time
 from .models import FileSaveHistory
 from performance.models import PerformanceStats
 
 
+def _to_date(value: Union[date, datetime, str]) -> date:
+    """将字符串、datetime 统一转换为 date"""
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def day_start(value: Union[date, datetime, str]) -> datetime:
+    """
+    返回某天零点的时间，用于构造 created_at 的半开区间过滤
+    
+    直接比较 created_at 可以使用索引，而 created_at__date 会对每行做日期转换；
+    区间右端请用 day_start(d + timedelta(days=1))，在日期上加一天再取零点
+    """
+    start = datetime.combine(_to_date(value), time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start
+
+
+def count_popular_paths(queryset, limit: int) -> List[Dict[str, Any]]:
+    """
+    在内存中统计热门路径
+    
+    最近时间窗口内路径高度集中，直接计数比数据库 GROUP BY 排序更快；
+    返回结构与 values('final_path').annotate(...) 的结果一致
+    """
+    counts = Counter()
+    sizes = Counter()
+    last_used = {}
+    # 计数与顺序无关，去掉默认排序
+    rows = queryset.order_by().values_list('final_path', 'file_size', 'created_at')
+    for final_path, file_size, created_at in rows.iterator():
+        counts[final_path] += 1
+        sizes[final_path] += file_size or 0
+        if final_path not in last_used or created_at > last_used[final_path]:
+            last_used[final_path] = created_at
+    
+    return [
+        {
+            'final_path': path,
+            'count': count,
+            'total_size': sizes[path],
+            'last_used': last_used[path]
+        }
+        for path, count in counts.most_common(limit)
+    ]
+
+
 class FileSaveHistoryService:
     """文件保存历史服务"""
     
@@ -54,10 +107,10 @@ class FileSaveHistoryService:
                 queryset = queryset.filter(save_mode=save_mode)
             
             if date_from:
-                queryset = queryset.filter(created_at__date__gte=date_from.date())
+                queryset = queryset.filter(created_at__gte=day_start(date_from))
             
             if date_to:
-                queryset = queryset.filter(created_at__date__lte=date_to.date())
+                queryset = queryset.filter(created_at__lt=day_start(_to_date(date_to) + timedelta(days=1)))
             
             if path_category:
                 queryset = queryset.filter(path_category=path_category)
@@ -205,14 +258,18 @@ class FileSaveHistoryService:
             start_date = end_date - timedelta(days=days)
             
             queryset = FileSaveHistory.objects.filter(
-                created_at__date__range=[start_date, end_date]
+                created_at__gte=day_start(start_date),
+                created_at__lt=day_start(end_date + timedelta(days=1))
             )
             
             # 按日期统计
             trends = []
             current_date = start_date
             while current_date <= end_date:
-                day_queryset = queryset.filter(created_at__date=current_date)
+                day_queryset = queryset.filter(
+                    created_at__gte=day_start(current_date),
+                    created_at__lt=day_start(current_date + timedelta(days=1))
+                )
                 count = day_queryset.count()
                 total_size = day_queryset.aggregate(total=Sum('file_size'))['total'] or 0
                 
@@ -259,12 +316,13 @@ class FileSaveHistoryService:
             }
     
     @staticmethod
-    def get_popular_paths(limit: int = 10) -> Dict[str, Any]:
+    def get_popular_paths(limit: int = 10, days: Optional[int] = None) -> Dict[str, Any]:
         """
         获取热门保存路径
         
         Args:
             limit: 结果限制
+            days: 统计最近天数（为空时统计全部记录）
             
         Returns:
             热门路径数据
@@ -272,10 +330,17 @@ class FileSaveHistoryService:
         start_time = timezone.now()
         
         try:
-            popular_paths = FileSaveHistory.objects.values('final_path').annotate(
-                count=Count('id'),
-                total_size=Sum('file_size')
-            ).order_by('-count')[:limit]
+            if days:
+                popular_paths = count_popular_paths(
+                    FileSaveHistory.objects.filter(created_at__gte=timezone.now() - timedelta(days=days)),
+                    limit
+                )
+            else:
+                popular_paths = FileSaveHistory.objects.values('final_path').annotate(
+                    count=Count('id'),
+                    total_size=Sum('file_size'),
+                    last_used=Max('created_at')
+                ).order_by('-count')[:limit]
             
             # 记录性能数据
             end_time = timezone.now()
@@ -334,9 +399,11 @@ class FileSaveHistoryService:
             # 应用过滤条件
             if filters:
                 if filters.get('date_from'):
-                    queryset = queryset.filter(created_at__date__gte=filters['date_from'])
+                    queryset = queryset.filter(created_at__gte=day_start(filters['date_from']))
                 if filters.get('date_to'):
-                    queryset = queryset.filter(created_at__date__lte=filters['date_to'])
+                    queryset = queryset.filter(
+                        created_at__lt=day_start(_to_date(filters['date_to']) + timedelta(days=1))
+                    )
                 if filters.get('file_extension'):
                     queryset = queryset.filter(file_extension=filters['file_extension'])
                 if filters.get('save_mode'):
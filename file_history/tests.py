@@ -1,3 +1,12 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+
+class SwaggerSchemaTest(TestCase):
+    """接口文档生成检查"""
+
+    def test_swagger_schema_generates(self):
+        """swagger_auto_schema 的参数与过滤后端冲突时文档生成会失败"""
+        response = self.client.get(reverse('schema-json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/history/search/', response.content.decode('utf-8'))
@@ -1,17 +1,20 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Q, Count, Sum, Avg, Max
 from django.utils import timezone
 from datetime import timedelta, datetime
 from .models import FileSaveHistory
+from .renderers import ORJSONRenderer
+from .services import day_start, count_popular_paths
 from .serializers import (
     FileSaveHistorySerializer,
     FileSaveHistoryCreateSerializer,
     FileSaveHistoryListSerializer,
-    FileSaveHistorySearchSerializer,
     FileSaveHistoryStatsSerializer
 )
 
@@ -19,11 +22,16 @@ from .serializers import (
 class FileSaveHistoryViewSet(viewsets.ModelViewSet):
     """文件保存历史视图集"""
     queryset = FileSaveHistory.objects.all()
+    renderer_classes = [ORJSONRenderer]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['file_extension', 'save_mode', 'path_category']
     search_fields = ['original_filename', 'final_path', 'content_preview']
     ordering_fields = ['created_at', 'file_size', 'original_filename']
     ordering = ['-created_at']
+    # 关联字段预加载配置：新增外键时在此登记，避免列表接口出现N+1查询
+    # 一对一/多对一关系写入select_related_fields，一对多/多对多关系写入prefetch_related_fields
+    select_related_fields = ()
+    prefetch_related_fields = ()
     
     def get_serializer_class(self):
         """根据动作返回不同的序列化器"""
@@ -37,6 +45,12 @@ class FileSaveHistoryViewSet(viewsets.ModelViewSet):
         """获取查询集"""
         queryset = super().get_queryset()
         
+        # 预加载关联对象
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        
         # 按日期范围过滤
         date_from = self.request.query_params.get('date_from')
         date_to = self.request.query_params.get('date_to')
@@ -44,14 +58,14 @@ class FileSaveHistoryViewSet(viewsets.ModelViewSet):
         if date_from:
             try:
                 date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                queryset = queryset.filter(created_at__date__gte=date_from)
+                queryset = queryset.filter(created_at__gte=day_start(date_from))
             except ValueError:
                 pass
         
         if date_to:
             try:
                 date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                queryset = queryset.filter(created_at__date__lte=date_to)
+                queryset = queryset.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
             except ValueError:
                 pass
         
@@ -106,14 +120,53 @@ class FileSaveHistoryViewSet(viewsets.ModelViewSet):
             'recent_files': recent_files
         })
     
+    def _parse_search_params(self, query_params):
+        """
+        解析搜索参数
+        
+        搜索是高频接口，这里直接解析查询参数，不再逐字段走序列化器校验
+        """
+        data = {}
+        errors = {}
+        
+        for field, max_length in (
+            ('query', 255), ('file_extension', 20),
+            ('save_mode', 50), ('path_category', 50),
+        ):
+            value = query_params.get(field)
+            if value:
+                data[field] = value[:max_length]
+        
+        for field in ('date_from', 'date_to'):
+            value = query_params.get(field)
+            if value:
+                try:
+                    data[field] = datetime.strptime(value, '%Y-%m-%d').date()
+                except ValueError:
+                    errors[field] = ['日期格式错误，应为 YYYY-MM-DD']
+        
+        if not errors and data.get('date_from') and data.get('date_to'):
+            if data['date_from'] > data['date_to']:
+                errors['non_field_errors'] = ['开始日期不能晚于结束日期']
+        
+        return data, errors
+    
+    # file_extension、save_mode、path_category 已由过滤后端生成文档，
+    # 这里只补充其余参数，重复声明会导致接口文档生成失败
+    @swagger_auto_schema(method='get', manual_parameters=[
+        openapi.Parameter('query', openapi.IN_QUERY, description="搜索关键词", type=openapi.TYPE_STRING),
+        openapi.Parameter('date_from', openapi.IN_QUERY, description="开始日期",
+                          type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+        openapi.Parameter('date_to', openapi.IN_QUERY, description="结束日期",
+                          type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+    ])
     @action(detail=False, methods=['get'])
     def search(self, request):
         """高级搜索"""
-        serializer = FileSaveHistorySearchSerializer(data=request.query_params)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data, errors = self._parse_search_params(request.query_params)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
         
-        data = serializer.validated_data
         queryset = self.get_queryset()
         
         # 关键词搜索
@@ -155,14 +208,18 @@ class FileSaveHistoryViewSet(viewsets.ModelViewSet):
         start_date = end_date - timedelta(days=days)
         
         queryset = self.get_queryset().filter(
-            created_at__date__range=[start_date, end_date]
+            created_at__gte=day_start(start_date),
+            created_at__lt=day_start(end_date + timedelta(days=1))
         )
         
         # 按日期统计
         trends = []
         current_date = start_date
         while current_date <= end_date:
-            day_queryset = queryset.filter(created_at__date=current_date)
+            day_queryset = queryset.filter(
+                created_at__gte=day_start(current_date),
+                created_at__lt=day_start(current_date + timedelta(days=1))
+            )
             count = day_queryset.count()
             total_size = day_queryset.aggregate(total=Sum('file_size'))['total'] or 0
             
@@ -181,14 +238,30 @@ class FileSaveHistoryViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def popular_paths(self, request):
-        """获取热门保存路径"""
+        """获取热门保存路径，可通过 days 只统计最近若干天"""
         limit = int(request.query_params.get('limit', 10))
+        queryset = self.get_queryset()
         
-        popular_paths = self.get_queryset().values('final_path').annotate(
-            count=Count('id'),
-            total_size=Sum('file_size'),
-            last_used=timezone.now()  # 这里应该用Max('created_at')
-        ).order_by('-count')[:limit]
+        days = request.query_params.get('days')
+        if days:
+            try:
+                days = int(days)
+                if days <= 0:
+                    raise ValueError
+            except ValueError:
+                return Response({'days': ['必须是正整数']}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # 最近时间窗口内在内存中计数
+            popular_paths = count_popular_paths(
+                queryset.filter(created_at__gte=timezone.now() - timedelta(days=days)),
+                limit
+            )
+        else:
+            popular_paths = queryset.values('final_path').annotate(
+                count=Count('id'),
+                total_size=Sum('file_size'),
+                last_used=Max('created_at')
+            ).order_by('-count')[:limit]
         
         return Response({
             'popular_paths': list(popular_paths)
@@ -207,10 +280,30 @@ class FileSaveHistoryViewSet(viewsets.ModelViewSet):
                 'download_url': '/api/history/export/download/'
             })
         elif format_type == 'json':
-            serializer = FileSaveHistoryListSerializer(queryset, many=True)
+            # 直接取列值，避免逐行走序列化器；输出字段和格式与
+            # FileSaveHistoryListSerializer 保持一致
+            created_at_field = serializers.DateTimeField()
+            recent_since = timezone.now() - timedelta(hours=24)
+            data = [
+                {
+                    'id': row['id'],
+                    'original_filename': row['original_filename'],
+                    'final_path': row['final_path'],
+                    'file_size_mb': round(row['file_size'] / (1024 * 1024), 2) if row['file_size'] else 0,
+                    'file_extension': row['file_extension'],
+                    'save_mode': row['save_mode'],
+                    'is_recent': row['created_at'] > recent_since,
+                    'path_category': row['path_category'],
+                    'created_at': created_at_field.to_representation(row['created_at']),
+                }
+                for row in queryset.values(
+                    'id', 'original_filename', 'final_path', 'file_size',
+                    'file_extension', 'save_mode', 'path_category', 'created_at'
+                )
+            ]
             return Response({
-                'message': f'已导出 {queryset.count()} 条记录为JSON格式',
-                'data': serializer.data
+                'message': f'已导出 {len(data)} 条记录为JSON格式',
+                'data': data
             })
         else:
             return Response(
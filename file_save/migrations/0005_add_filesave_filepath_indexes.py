@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2025-09-20 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_save', '0004_add_filesavehistory_model'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filepath',
+            index=models.Index(fields=['-usage_count', '-last_used_at', '-created_at'], name='file_paths_usage_c_fb6e7a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filepath',
+            index=models.Index(fields=['is_active', 'category'], name='file_paths_is_acti_10baa4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filesave',
+            index=models.Index(fields=['content_type', 'is_indexed'], name='file_saves_content_04546f_idx'),
+        ),
+    ]
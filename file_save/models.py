@@ -2,6 +2,10 @@ from django.db import models
 from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 
+# 图片/文档扩展名集合（小写），供模型属性和视图过滤共用
+IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'svg'})
+DOCUMENT_EXTENSIONS = frozenset({'pdf', 'doc', 'docx', 'txt', 'rtf', 'odt'})
+
 
 class FilePath(models.Model):
     """文件路径管理模型"""
@@ -25,6 +29,10 @@ class FilePath(models.Model):
     class Meta:
         db_table = 'file_paths'
         ordering = ['-usage_count', '-last_used_at', '-created_at']
+        indexes = [
+            models.Index(fields=['-usage_count', '-last_used_at', '-created_at']),
+            models.Index(fields=['is_active', 'category']),
+        ]
         verbose_name = "文件路径"
         verbose_name_plural = "文件路径"
     
@@ -32,10 +40,13 @@ class FilePath(models.Model):
         return f"{self.path_pattern} ({self.get_category_display()})"
     
     def increment_usage(self):
-        """增加使用次数并更新最后使用时间"""
-        self.usage_count += 1
+        """增加使用次数并更新最后使用时间（数据库端原子自增，避免并发丢失计数）"""
         self.last_used_at = timezone.now()
-        self.save(update_fields=['usage_count', 'last_used_at'])
+        FilePath.objects.filter(pk=self.pk).update(
+            usage_count=models.F('usage_count') + 1,
+            last_used_at=self.last_used_at
+        )
+        self.refresh_from_db(fields=['usage_count'])
     
     @property
     def is_frequent(self):
@@ -59,6 +70,9 @@ class FileSave(models.Model):
     class Meta:
         db_table = 'file_saves'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['content_type', 'is_indexed']),
+        ]
         verbose_name = "文件保存记录"
         verbose_name_plural = "文件保存记录"
     
@@ -73,14 +87,12 @@ class FileSave(models.Model):
     @property
     def is_image(self):
         """判断是否为图片文件"""
-        image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'svg']
-        return self.file_extension.lower() in image_extensions
+        return self.file_extension.lower() in IMAGE_EXTENSIONS
     
     @property
     def is_document(self):
         """判断是否为文档文件"""
-        doc_extensions = ['pdf', 'doc', 'docx', 'txt', 'rtf', 'odt']
-        return self.file_extension.lower() in doc_extensions
+        return self.file_extension.lower() in DOCUMENT_EXTENSIONS
 
 
 class FileSaveHistory(models.Model):
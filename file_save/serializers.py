@@ -1,5 +1,43 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework import serializers
 from .models import FileSave, FilePath
+from .services import stream_b64_to_file
+
+# base64 合法字符（允许换行等空白），末尾最多两个 '=' 填充
+_B64_RE = re.compile(r'[A-Za-z0-9+/\s]+={0,2}\s*')
+_WS_RE = re.compile(r'\s+')
+
+def _validate_b64(value):
+    """只检查base64字符集和长度，不实际解码（保存时会分块解码）"""
+    data_length = len(value) - sum(map(len, _WS_RE.findall(value)))
+    if not _B64_RE.fullmatch(value) or data_length % 4:
+        raise serializers.ValidationError("无效的base64编码")
+
+
+# 写本地文件的线程池，使磁盘写入和数据库插入同时进行
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='file-write')
+
+
+def _write_local_file(file_path, content_data):
+    """将base64内容写入本地文件，失败时只记录不抛出"""
+    try:
+        # 创建目录（如果不存在）
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+            print(f"创建目录: {directory}")
+        
+        # 分块解码base64内容并写入文件
+        if content_data:
+            stream_b64_to_file(content_data, file_path)
+            print(f"文件保存成功: {file_path}")
+        else:
+            print(f"警告: 文件内容为空，跳过文件创建: {file_path}")
+            
+    except Exception as e:
+        print(f"保存文件到本地失败: {e}")
 
 
 class FilePathSerializer(serializers.ModelSerializer):
@@ -86,13 +124,7 @@ class FileSaveSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError("文件内容不能为空")
         
-        # 简单的base64验证
-        import base64
-        try:
-            base64.b64decode(value)
-        except Exception:
-            raise serializers.ValidationError("无效的base64编码")
-        
+        _validate_b64(value)
         return value
 
 
@@ -107,11 +139,19 @@ class FileSaveCreateSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id']
     
+    def validate_content_data(self, value):
+        """
+        验证base64内容
+        
+        本地文件分块严格解码，非法内容会导致只写入数据库记录而没有本地文件，
+        这里提前拒绝；空内容仍允许（只记录文件信息）
+        """
+        if value:
+            _validate_b64(value)
+        return value
+    
     def create(self, validated_data):
         """创建文件保存记录并实际保存文件到本地"""
-        import os
-        import base64
-        
         # 自动设置文件扩展名
         if not validated_data.get('file_extension'):
             filename = validated_data.get('filename', '')
@@ -122,28 +162,14 @@ class FileSaveCreateSerializer(serializers.ModelSerializer):
         file_path = validated_data.get('file_path', '')
         content_data = validated_data.get('content_data', '')
         
+        # 在后台线程写本地文件，同时插入数据库记录
+        # 即使本地保存失败，也继续保存数据库记录
+        # 这样至少可以在数据库中记录文件信息
+        write_future = _IO_POOL.submit(_write_local_file, file_path, content_data)
         try:
-            # 创建目录（如果不存在）
-            directory = os.path.dirname(file_path)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory, exist_ok=True)
-                print(f"创建目录: {directory}")
-            
-            # 解码base64内容并写入文件
-            if content_data:
-                file_content = base64.b64decode(content_data)
-                with open(file_path, 'wb') as f:
-                    f.write(file_content)
-                print(f"文件保存成功: {file_path}")
-            else:
-                print(f"警告: 文件内容为空，跳过文件创建: {file_path}")
-                
-        except Exception as e:
-            print(f"保存文件到本地失败: {e}")
-            # 即使本地保存失败，也继续保存数据库记录
-            # 这样至少可以在数据库中记录文件信息
-        
-        return super().create(validated_data)
+            return super().create(validated_data)
+        finally:
+            write_future.result()
 
 
 class FileSaveListSerializer(serializers.ModelSerializer):
@@ -1,18 +1,147 @@
 import base64
+import functools
 import os
 import mimetypes
 from typing import Optional, Dict, Any
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils import timezone
 from .models import FileSave
-from file_history.models import FileSaveHistory
+from file_history.models import FileSaveHistory, classify_path
 from performance.models import PerformanceStats
 
+# 流式解码时每块输出的字节数
+B64_CHUNK_SIZE = 1 << 20
+
+
+def iter_b64_decode(b64_str: str, chunk_size: int = B64_CHUNK_SIZE):
+    """
+    分块解码base64字符串，逐块产出解码后的字节
+    
+    每次只解码 4 的整数倍个字符，不足一组的字符留到下一块，
+    避免一次性生成与整个文件等大的 bytes 对象
+    
+    Args:
+        b64_str: base64编码的字符串
+        chunk_size: 每块解码后的字节数
+    """
+    step = max(chunk_size // 3, 1) * 4
+    carry = ''
+    for i in range(0, len(b64_str), step):
+        piece = carry + ''.join(b64_str[i:i + step].split())
+        usable = len(piece) - len(piece) % 4
+        carry = piece[usable:]
+        if usable:
+            yield base64.b64decode(piece[:usable])
+    if carry:
+        yield base64.b64decode(carry)
+
+
+def stream_b64_to_file(b64_str: str, path: str, chunk_size: int = B64_CHUNK_SIZE) -> int:
+    """
+    将base64内容分块解码并直接写入文件
+    
+    Args:
+        b64_str: base64编码的字符串
+        path: 目标文件路径
+        chunk_size: 每块解码后的字节数
+        
+    Returns:
+        写入的字节数
+    """
+    written = 0
+    with open(path, 'wb') as f:
+        for data in iter_b64_decode(b64_str, chunk_size):
+            f.write(data)
+            written += len(data)
+    return written
+
+
+def decode_b64_head(b64_str: str, chunk_size: int = B64_CHUNK_SIZE):
+    """
+    分块解码base64内容，只保留第一块用于生成预览
+    
+    Returns:
+        (首块字节, 解码后的总字节数)
+    """
+    head = b''
+    size = 0
+    for data in iter_b64_decode(b64_str, chunk_size):
+        if not size:
+            head = data
+        size += len(data)
+    return head, size
+
+
+@functools.lru_cache(maxsize=2048)
+def guess_content_type(file_extension: str) -> str:
+    """根据扩展名推断内容类型（按扩展名缓存结果）"""
+    content_type, _ = mimetypes.guess_type(f"file.{file_extension}")
+    return content_type or 'application/octet-stream'
+
 
 class FileSaveService:
     """文件保存服务"""
     
+    @staticmethod
+    def _save_file_core(
+        filename: str,
+        content_data: str,
+        file_path: Optional[str] = None,
+        save_mode: str = 'manual'
+    ):
+        """
+        解码文件并构造待保存的模型实例（不访问数据库）
+        
+        Args:
+            filename: 文件名
+            content_data: base64编码的文件内容
+            file_path: 保存路径（可选）
+            save_mode: 保存模式
+            
+        Returns:
+            (FileSave实例, FileSaveHistory实例, 保存结果字典)
+        """
+        # 分块解码base64内容，仅保留首块用于预览
+        file_head, file_size = decode_b64_head(content_data)
+        
+        # 自动生成文件路径
+        if not file_path:
+            file_path = f"/uploads/{filename}"
+        
+        # 获取文件扩展名和内容类型
+        file_extension = os.path.splitext(filename)[1][1:].lower()
+        content_type = guess_content_type(file_extension)
+        
+        file_save = FileSave(
+            filename=filename,
+            file_path=file_path,
+            file_size=file_size,
+            file_extension=file_extension,
+            content_type=content_type,
+            content_data=content_data
+        )
+        history = FileSaveHistory(
+            original_filename=filename,
+            final_path=file_path,
+            file_size=file_size,
+            file_extension=file_extension,
+            content_preview=FileSaveService._generate_preview(file_head, content_type, file_size),
+            save_mode=save_mode,
+            # bulk_create 不会调用 save()，需手动填充路径分类
+            path_category=classify_path(file_path)
+        )
+        result = {
+            'success': True,
+            'filename': filename,
+            'file_path': file_path,
+            'file_size': file_size,
+            'message': '文件保存成功'
+        }
+        return file_save, history, result
+    
     @staticmethod
     def save_file(
         filename: str,
@@ -35,39 +164,13 @@ class FileSaveService:
         start_time = timezone.now()
         
         try:
-            # 解码base64内容
-            file_content = base64.b64decode(content_data)
-            file_size = len(file_content)
-            
-            # 自动生成文件路径
-            if not file_path:
-                file_path = f"/uploads/{filename}"
-            
-            # 获取文件扩展名和内容类型
-            file_extension = os.path.splitext(filename)[1][1:].lower()
-            content_type, _ = mimetypes.guess_type(filename)
-            if not content_type:
-                content_type = 'application/octet-stream'
-            
-            # 创建文件保存记录
-            file_save = FileSave.objects.create(
-                filename=filename,
-                file_path=file_path,
-                file_size=file_size,
-                file_extension=file_extension,
-                content_type=content_type,
-                content_data=content_data
+            file_save, history, result = FileSaveService._save_file_core(
+                filename, content_data, file_path, save_mode
             )
             
-            # 创建历史记录
-            FileSaveHistory.objects.create(
-                original_filename=filename,
-                final_path=file_path,
-                file_size=file_size,
-                file_extension=file_extension,
-                content_preview=FileSaveService._generate_preview(file_content, content_type),
-                save_mode=save_mode
-            )
+            # 创建文件保存记录和历史记录
+            file_save.save()
+            history.save()
             
             # 记录性能数据
             end_time = timezone.now()
@@ -77,17 +180,11 @@ class FileSaveService:
                 operation_type='file_save',
                 response_time_ms=response_time,
                 success=True,
-                file_size=file_size
+                file_size=result['file_size']
             )
             
-            return {
-                'success': True,
-                'file_id': file_save.id,
-                'filename': filename,
-                'file_path': file_path,
-                'file_size': file_size,
-                'message': '文件保存成功'
-            }
+            result['file_id'] = file_save.id
+            return result
             
         except Exception as e:
             # 记录错误性能数据
@@ -178,6 +275,9 @@ class FileSaveService:
         """
         批量保存文件
         
+        先解码全部文件并构造模型实例，再在一个事务内用 bulk_create 分批写入
+        文件记录、历史记录和性能数据，避免每个文件单独插入和提交
+        
         Args:
             files_data: 文件数据列表
             
@@ -185,31 +285,85 @@ class FileSaveService:
             批量保存结果
         """
         start_time = timezone.now()
+        batch_size = settings.BULK_BATCH_SIZE
+        
         results = []
-        success_count = 0
+        file_objs = []
+        history_objs = []
+        stats_objs = []
         
         for file_data in files_data:
-            result = FileSaveService.save_file(
-                filename=file_data.get('filename'),
-                content_data=file_data.get('content_data'),
-                file_path=file_data.get('file_path'),
-                save_mode='batch'
+            item_start = timezone.now()
+            
+            try:
+                file_save, history, result = FileSaveService._save_file_core(
+                    filename=file_data.get('filename'),
+                    content_data=file_data.get('content_data'),
+                    file_path=file_data.get('file_path'),
+                    save_mode='batch'
+                )
+                file_objs.append(file_save)
+                history_objs.append(history)
+                stats_objs.append(PerformanceStats(
+                    operation_type='file_save',
+                    response_time_ms=(timezone.now() - item_start).total_seconds() * 1000,
+                    success=True,
+                    file_size=result['file_size']
+                ))
+                results.append(result)
+                
+            except Exception as e:
+                stats_objs.append(PerformanceStats(
+                    operation_type='file_save',
+                    response_time_ms=(timezone.now() - item_start).total_seconds() * 1000,
+                    success=False,
+                    error_message=str(e)
+                ))
+                results.append({
+                    'success': False,
+                    'error': str(e),
+                    'message': '文件保存失败'
+                })
+        
+        success_results = [r for r in results if r['success']]
+        
+        try:
+            with transaction.atomic():
+                FileSave.objects.bulk_create(file_objs, batch_size=batch_size)
+                FileSaveHistory.objects.bulk_create(history_objs, batch_size=batch_size)
+                
+                for result, file_save in zip(success_results, file_objs):
+                    result['file_id'] = file_save.id
+                
+                # 记录汇总性能数据
+                response_time = (timezone.now() - start_time).total_seconds() * 1000
+                stats_objs.append(PerformanceStats(
+                    operation_type='file_save',
+                    response_time_ms=response_time,
+                    success=bool(success_results),
+                    file_size=sum(r['file_size'] for r in success_results)
+                ))
+                PerformanceStats.objects.bulk_create(stats_objs, batch_size=batch_size)
+                
+        except Exception as e:
+            # 批量写入失败时整批回滚，所有文件均视为失败
+            for result in success_results:
+                result.update({
+                    'success': False,
+                    'error': str(e),
+                    'message': '文件保存失败'
+                })
+                result.pop('file_id', None)
+            success_results = []
+            
+            PerformanceStats.objects.create(
+                operation_type='file_save',
+                response_time_ms=(timezone.now() - start_time).total_seconds() * 1000,
+                success=False,
+                error_message=str(e)
             )
-            results.append(result)
-            if result['success']:
-                success_count += 1
-        
-        # 记录性能数据
-        end_time = timezone.now()
-        response_time = (end_time - start_time).total_seconds() * 1000
-        
-        PerformanceStats.objects.create(
-            operation_type='file_save',
-            response_time_ms=response_time,
-            success=success_count > 0,
-            file_size=sum(r.get('file_size', 0) for r in results if r.get('success'))
-        )
         
+        success_count = len(success_results)
         return {
             'success': success_count > 0,
             'total_files': len(files_data),
@@ -220,17 +374,21 @@ class FileSaveService:
         }
     
     @staticmethod
-    def _generate_preview(file_content: bytes, content_type: str) -> str:
+    def _generate_preview(file_content: bytes, content_type: str, file_size: Optional[int] = None) -> str:
         """
         生成文件内容预览
         
         Args:
-            file_content: 文件内容
+            file_content: 文件内容（可以只是开头部分）
             content_type: 内容类型
+            file_size: 文件总大小，未提供时取 file_content 的长度
             
         Returns:
             预览文本
         """
+        if file_size is None:
+            file_size = len(file_content)
+        
         try:
             if content_type.startswith('text/'):
                 # 文本文件预览
@@ -239,7 +397,7 @@ class FileSaveService:
             
             elif content_type.startswith('image/'):
                 # 图片文件预览
-                return f"[图片文件，大小: {len(file_content)} 字节]"
+                return f"[图片文件，大小: {file_size} 字节]"
             
             elif content_type in ['application/pdf']:
                 # PDF文件预览
@@ -247,7 +405,7 @@ class FileSaveService:
             
             else:
                 # 其他文件类型
-                return f"[{content_type} 文件，大小: {len(file_content)} 字节]"
+                return f"[{content_type} 文件，大小: {file_size} 字节]"
                 
         except Exception:
-            return f"[文件预览生成失败，大小: {len(file_content)} 字节]"
+            return f"[文件预览生成失败，大小: {file_size} 字节]"
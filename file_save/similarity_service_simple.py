@@ -8,25 +8,318 @@
 import os
 import sys
 import json
+import base64
 import hashlib
+import heapq
 import logging
 import re
 import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Optional, Tuple, Any
 from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, defaultdict
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时使用标准库json
+    orjson = None
+
+try:
+    from blake3 import blake3
+except ImportError:  # 未安装blake3时使用标准库blake2b
+    blake3 = None
 
 logger = logging.getLogger(__name__)
 
+
+def _dumps(obj) -> bytes:
+    """序列化为JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _loads(data: bytes):
+    """解析JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+# 特征提取用到的正则，在模块加载时编译一次
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_NON_TEXT_RE = re.compile(r'[^\u4e00-\u9fa5a-zA-Z0-9\s]')
+_TOKEN_RE = re.compile(r'\b\w+\b')
+_SENTENCE_SPLIT_RE = re.compile(r'[。！？]')
+# 网址、邮箱、手机号、日期只含ASCII字符，使用 re.ASCII 匹配更快；
+# 同时 \b 不再把中文视为单词字符，紧挨中文的邮箱也能识别
+_URL_RE = re.compile(r'https?://', re.ASCII)
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b', re.ASCII)
+_PHONE_RE = re.compile(r'1[3-9]\d{9}', re.ASCII)
+_DATE_RE = re.compile(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}', re.ASCII)
+_DATE_WORD_RE = re.compile(r'今天|昨天|明天|今年|去年|明年')
+_CHINESE_RUN_RE = re.compile(r'[\u4e00-\u9fa5]+')
+_ENGLISH_RUN_RE = re.compile(r'[a-zA-Z]+')
+_DIGIT_RUN_RE = re.compile(r'\d+')
+
+# 简单的情感词典
+POSITIVE_WORDS = frozenset({'好', '棒', '优秀', '完美', '喜欢', '爱', '开心', '高兴', '满意', '成功'})
+NEGATIVE_WORDS = frozenset({'坏', '差', '糟糕', '讨厌', '恨', '难过', '失望', '失败', '问题', '错误'})
+
+# 特征提取逻辑的版本号：修改特征提取（增删特征、调整分词或正则）后需递增，
+# 重建索引时只复用版本一致的已有特征
+FEATURE_VERSION = 1
+
+# 相似度计算的特征权重
+FEATURE_WEIGHTS = {
+    'word_count': 0.08,
+    'char_count': 0.05,
+    'unique_words': 0.08,
+    'avg_word_length': 0.05,
+    'common_words': 0.30,
+    'word_frequency': 0.30,
+    'vocabulary_richness': 0.08,
+    'sentence_count': 0.03,
+    'paragraph_count': 0.03,
+    'has_numbers': 0.02,
+    'has_urls': 0.02,
+    'has_emails': 0.02,
+    'has_phone': 0.02,
+    'chinese_ratio': 0.05,
+    'english_ratio': 0.05,
+    'digit_ratio': 0.03,
+    'sentiment_score': 0.08,
+    'has_time': 0.02,
+    'has_date': 0.02,
+    'semantic_keywords': 0.15,
+}
+
+# 字典类型特征，以及以 (词, 分数) 列表存储、比较前需转为字典的特征
+DICT_FEATURES = frozenset({'common_words', 'word_frequency'})
+PAIR_LIST_FEATURES = frozenset({'semantic_keywords'})
+
+
+def _build_feature_order():
+    """
+    确定相似度计算的特征顺序：廉价的数值/布尔特征在前，字典类特征在后
+    
+    每项为 (特征名, 权重, 之后剩余特征的权重和)，剩余权重用于提前剪枝
+    """
+    ordered = sorted(
+        FEATURE_WEIGHTS.items(),
+        key=lambda item: item[0] in DICT_FEATURES or item[0] in PAIR_LIST_FEATURES
+    )
+    return [
+        (feature, weight, sum(w for _, w in ordered[i + 1:]))
+        for i, (feature, weight) in enumerate(ordered)
+    ]
+
+
+FEATURE_ORDER = _build_feature_order()
+
+# 与查询没有共同高频词的文档，common_words 相似度为0，其余特征全部满分时
+# 综合相似度的上界；阈值高于该值时这些文档不可能入选，可以安全跳过
+NON_CANDIDATE_MAX_SCORE = 1.0 - FEATURE_WEIGHTS['common_words'] / sum(FEATURE_WEIGHTS.values())
+
+
+def _content_key(content: str) -> str:
+    """
+    计算查询内容的缓存键
+    
+    优先使用 blake3，未安装时使用 blake2b（均比 md5 更快），并附带内容长度；
+    不只对开头部分取摘要，避免开头相同的不同文档命中同一缓存
+    """
+    data = content.encode('utf-8')
+    if blake3 is not None:
+        digest = blake3(data).hexdigest(length=16)
+    else:
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f"{len(content)}:{digest}"
+
+
+def _compute_text_features(content: str) -> Dict[str, Any]:
+    """
+    提取文本特征（增强版）
+    
+    各步骤只依赖模块级常量，不依赖服务实例，可以直接在子进程中执行
+    """
+    try:
+        # 基础文本清理
+        cleaned_content = _clean_text(content)
+        
+        # 分词（简单版本）
+        words = _simple_tokenize(cleaned_content)
+        word_count = len(words)
+        word_counts = Counter(words)
+        unique_count = len(word_counts)
+        # 按不同词累计长度，重复出现的词只计算一次
+        total_length = sum(len(word) * count for word, count in word_counts.items())
+        chinese_ratio, english_ratio, digit_ratio = _get_char_ratios(content)
+        # 先用简单的子串判断排除不可能匹配的情况，再执行正则
+        has_numbers = digit_ratio > 0
+        
+        # 提取各种特征
+        features = {
+            # 基础统计特征
+            'word_count': word_count,
+            'char_count': len(content),
+            'unique_words': unique_count,
+            'avg_word_length': total_length / word_count if words else 0,
+            
+            # 词汇特征
+            'common_words': dict(word_counts.most_common(20)),
+            'word_frequency': _calculate_word_frequency(word_counts, word_count),
+            'vocabulary_richness': unique_count / word_count if words else 0,
+            
+            # 结构特征
+            'sentence_count': len(_SENTENCE_SPLIT_RE.split(content)),
+            'paragraph_count': len([p for p in content.split('\n') if p.strip()]),
+            'has_numbers': has_numbers,
+            'has_urls': '://' in content and bool(_URL_RE.search(content)),
+            'has_emails': '@' in content and bool(_EMAIL_RE.search(content)),
+            'has_phone': has_numbers and bool(_PHONE_RE.search(content)),
+            
+            # 语言特征
+            'chinese_ratio': chinese_ratio,
+            'english_ratio': english_ratio,
+            'digit_ratio': digit_ratio,
+            
+            # 语义特征（简化版）
+            'semantic_keywords': _extract_semantic_keywords(word_counts, word_count),
+            
+            # 时间特征
+            'has_time': has_numbers and bool(_DATE_RE.search(content)),
+            'has_date': bool(_DATE_WORD_RE.search(content)),
+            
+            # 情感特征（简化版）
+            'sentiment_score': _calculate_sentiment_score(word_counts),
+        }
+        
+        return features
+        
+    except Exception as e:
+        logger.error(f"提取文本特征失败: {e}")
+        return {}
+
+
+def _clean_text(content: str) -> str:
+    """清理文本"""
+    # 移除HTML标签（不含'<'时无需执行正则）
+    if '<' in content:
+        content = _HTML_TAG_RE.sub('', content)
+    # 移除特殊字符但保留中文、英文、数字，再一次性合并空白
+    return ' '.join(_NON_TEXT_RE.sub(' ', content).split())
+
+
+def _simple_tokenize(content: str) -> List[str]:
+    """简单分词"""
+    # 按空格和标点符号分词，过滤单字符词
+    return [w for w in _TOKEN_RE.findall(content) if len(w) > 1]
+
+
+def _calculate_word_frequency(word_counts: Counter, total_words: int) -> Dict[str, float]:
+    """计算词频（基于已统计好的词频计数）"""
+    if not total_words:
+        return {}
+    return {word: count / total_words for word, count in word_counts.items()}
+
+
+def _extract_semantic_keywords(word_counts: Counter, total_words: int) -> List[Tuple[str, float]]:
+    """提取语义关键词（基于词频和长度）"""
+    if not total_words:
+        return []
+    
+    # 计算词的重要性分数：长度分数 + 频率分数，每个词只统计一次
+    word_scores = {
+        word: len(word) / 10 + count / total_words * 100
+        for word, count in word_counts.items()
+        if len(word) >= 2  # 至少2个字符
+    }
+    
+    # 返回得分最高的前10个词
+    return sorted(word_scores.items(), key=lambda x: x[1], reverse=True)[:10]
+
+
+def _get_char_ratios(content: str) -> Tuple[float, float, float]:
+    """获取中文、英文、数字字符所占比例"""
+    if not content:
+        return 0.0, 0.0, 0.0
+    # 按连续字符段匹配，比逐字符匹配产生的对象少得多
+    total = len(content)
+    chinese_chars = sum(map(len, _CHINESE_RUN_RE.findall(content)))
+    english_chars = sum(map(len, _ENGLISH_RUN_RE.findall(content)))
+    digit_chars = sum(map(len, _DIGIT_RUN_RE.findall(content)))
+    return chinese_chars / total, english_chars / total, digit_chars / total
+
+
+def _calculate_sentiment_score(word_counts: Counter) -> float:
+    """计算情感分数（简化版），按情感词典中的词查词频，而不是逐个遍历分词结果"""
+    if not word_counts:
+        return 0.0
+    
+    positive_count = sum(word_counts[word] for word in POSITIVE_WORDS if word in word_counts)
+    negative_count = sum(word_counts[word] for word in NEGATIVE_WORDS if word in word_counts)
+    
+    if positive_count + negative_count == 0:
+        return 0.0
+    
+    return (positive_count - negative_count) / (positive_count + negative_count)
+
+
 class SimilarityServiceSimple:
     """清理版相似度检测服务 - 专注基础算法"""
     
+    # 追加日志中的记录数超过该值时，合并写入 metadata.json 并清空日志
+    COMPACT_RECORDS = 500
+    # 索引中为每个文档保留的预览字符数，只在展示检索结果时使用
+    PREVIEW_LENGTH = 200
+    # 查询特征缓存的条目数、所有缓存内容的总长度上限（字符），
+    # 以及参与缓存的单个内容最大长度；特征占用的内存随内容长度增长
+    FEATURE_CACHE_SIZE = 1024
+    FEATURE_CACHE_MAX_CHARS = 8 * 1024 * 1024
+    FEATURE_CACHE_MAX_CONTENT = 256 * 1024
+    
+    # 重建索引时跳过超过该大小（字节）的文档
+    MAX_INDEX_FILE_SIZE = 10 * 1024 * 1024
+    
+    # 写入索引的浮点特征保留的有效数字位数，缩小索引文件体积；
+    # 相似度按相对差值比较，按有效数字取整可保证相对误差不超过约 5e-4
+    FEATURE_SIGNIFICANT_DIGITS = 4
+    
+    # 批量提取特征时，文档数不少于该值才启用多进程
+    PARALLEL_MIN_DOCS = 32
+    # 重建索引时每批读取并提取特征的文档数
+    REBUILD_BATCH_SIZE = 500
+    
     def __init__(self):
         self.document_metadata = {}
+        # 倒排索引：高频词 -> 包含该词的文档ID集合，只在高阈值查询时使用，
+        # 首次需要时才构建（见 _candidate_documents），为None表示尚未构建
+        self._postings = None
         self.index_path = os.path.join(settings.BASE_DIR, 'data', 'similarity_index')
         
+        # 新增文档先追加到 records.jsonl，定期合并到 metadata.json
+        self._save_lock = threading.Lock()
+        self._pending_records = 0
+        
+        # 保护内存索引的修改；重建期间新增的文档记录在 _rebuild_added 中，
+        # 重建完成替换索引时合并进去，避免被重建结果覆盖丢失
+        self._index_lock = threading.Lock()
+        self._rebuild_added = None
+        # 同一时间只允许一个重建任务
+        self._rebuild_lock = threading.Lock()
+        
+        # 索引内容每次变化都递增，作为结果缓存键的一部分使旧结果失效
+        self._cache_version = 0
+        
+        # 按内容摘要缓存的特征提取结果（LRU）
+        self._feature_cache = OrderedDict()
+        self._feature_cache_chars = 0
+        self._feature_cache_lock = threading.Lock()
+        
         # 为后期AI升级预留的接口
         self.ai_interface = None
         self.ai_available = False
@@ -34,197 +327,60 @@ class SimilarityServiceSimple:
         # 加载现有索引
         self.load_or_create_index()
     
-    def _extract_text_features(self, content: str) -> Dict[str, Any]:
-        """提取文本特征（增强版）"""
-        try:
-            # 基础文本清理
-            cleaned_content = self._clean_text(content)
-            
-            # 分词（简单版本）
-            words = self._simple_tokenize(cleaned_content)
-            
-            # 提取各种特征
-            features = {
-                # 基础统计特征
-                'word_count': len(words),
-                'char_count': len(content),
-                'unique_words': len(set(words)),
-                'avg_word_length': sum(len(w) for w in words) / len(words) if words else 0,
-                
-                # 词汇特征
-                'common_words': dict(Counter(words).most_common(20)),
-                'word_frequency': self._calculate_word_frequency(words),
-                'vocabulary_richness': len(set(words)) / len(words) if words else 0,
-                
-                # 结构特征
-                'sentence_count': len(re.split(r'[。！？]', content)),
-                'paragraph_count': len([p for p in content.split('\n') if p.strip()]),
-                'has_numbers': bool(re.search(r'\d', content)),
-                'has_urls': bool(re.search(r'http[s]?://', content)),
-                'has_emails': bool(re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', content)),
-                'has_phone': bool(re.search(r'1[3-9]\d{9}', content)),
-                
-                # 语言特征
-                'chinese_ratio': self._get_chinese_ratio(content),
-                'english_ratio': self._get_english_ratio(content),
-                'digit_ratio': self._get_digit_ratio(content),
-                
-                # 语义特征（简化版）
-                'semantic_keywords': self._extract_semantic_keywords(words),
-                'topic_words': self._extract_topic_words(words),
-                
-                # 时间特征
-                'has_time': bool(re.search(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}', content)),
-                'has_date': bool(re.search(r'(今天|昨天|明天|今年|去年|明年)', content)),
-                
-                # 情感特征（简化版）
-                'sentiment_score': self._calculate_sentiment_score(words),
-            }
-            
-            return features
-            
-        except Exception as e:
-            logger.error(f"提取文本特征失败: {e}")
-            return {}
-    
-    def _clean_text(self, content: str) -> str:
-        """清理文本"""
-        # 移除HTML标签
-        content = re.sub(r'<[^>]+>', '', content)
-        # 移除多余空白
-        content = re.sub(r'\s+', ' ', content)
-        # 移除特殊字符但保留中文、英文、数字
-        content = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9\s]', ' ', content)
-        return content.strip()
-    
-    def _simple_tokenize(self, content: str) -> List[str]:
-        """简单分词"""
-        # 按空格和标点符号分词
-        words = re.findall(r'\b\w+\b', content)
-        # 过滤单字符词
-        words = [w for w in words if len(w) > 1]
-        return words
-    
-    def _calculate_word_frequency(self, words: List[str]) -> Dict[str, float]:
-        """计算词频"""
-        if not words:
-            return {}
-        word_count = Counter(words)
-        total_words = len(words)
-        return {word: count / total_words for word, count in word_count.items()}
-    
-    def _extract_semantic_keywords(self, words: List[str]) -> List[Tuple[str, float]]:
-        """提取语义关键词（基于词频和长度）"""
-        if not words:
-            return []
+    def _extract_query_features(self, content: str, content_key: str = None) -> Dict[str, Any]:
+        """
+        提取查询文本的特征，相同内容重复查询时直接使用缓存结果
         
-        # 计算词的重要性分数
-        word_scores = {}
-        for word in words:
-            if len(word) >= 2:  # 至少2个字符
-                # 基于词频和长度的综合评分
-                freq = words.count(word)
-                length_score = len(word) / 10  # 长度分数
-                freq_score = freq / len(words) * 100  # 频率分数
-                word_scores[word] = length_score + freq_score
-        
-        # 返回得分最高的前10个词
-        return sorted(word_scores.items(), key=lambda x: x[1], reverse=True)[:10]
-    
-    def _extract_topic_words(self, words: List[str]) -> List[Tuple[str, float]]:
-        """提取主题词（基于TF简化版）"""
-        if not words:
-            return []
+        只用于查询端：建索引时特征已保存在 document_metadata 中，无需再缓存。
+        content_key 为调用方已计算好的内容摘要，传入时不再重复计算
+        """
+        size = len(content)
+        if size > self.FEATURE_CACHE_MAX_CONTENT:
+            return _compute_text_features(content)
         
-        # 简化的TF计算
-        word_count = Counter(words)
-        total_words = len(words)
+        key = content_key or _content_key(content)
+        with self._feature_cache_lock:
+            cached = self._feature_cache.get(key)
+            if cached is not None:
+                self._feature_cache.move_to_end(key)
+                # 返回浅拷贝，调用方修改顶层键时不影响缓存
+                return dict(cached[0])
         
-        # 计算TF分数
-        tf_scores = {}
-        for word, count in word_count.items():
-            if len(word) >= 2:
-                tf_scores[word] = count / total_words
-        
-        # 返回TF分数最高的词
-        return sorted(tf_scores.items(), key=lambda x: x[1], reverse=True)[:15]
-    
-    def _get_chinese_ratio(self, content: str) -> float:
-        """获取中文字符比例"""
-        if not content:
-            return 0.0
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fa5]', content))
-        return chinese_chars / len(content)
-    
-    def _get_english_ratio(self, content: str) -> float:
-        """获取英文字符比例"""
-        if not content:
-            return 0.0
-        english_chars = len(re.findall(r'[a-zA-Z]', content))
-        return english_chars / len(content)
-    
-    def _get_digit_ratio(self, content: str) -> float:
-        """获取数字字符比例"""
-        if not content:
-            return 0.0
-        digit_chars = len(re.findall(r'\d', content))
-        return digit_chars / len(content)
+        features = _compute_text_features(content)
+        if features:
+            with self._feature_cache_lock:
+                if key not in self._feature_cache:
+                    self._feature_cache[key] = (features, size)
+                    self._feature_cache_chars += size
+                # 同时按条目数和内容总长度淘汰最久未使用的结果
+                while (len(self._feature_cache) > self.FEATURE_CACHE_SIZE
+                       or self._feature_cache_chars > self.FEATURE_CACHE_MAX_CHARS):
+                    _, (_, evicted_size) = self._feature_cache.popitem(last=False)
+                    self._feature_cache_chars -= evicted_size
+        return dict(features)
     
-    def _calculate_sentiment_score(self, words: List[str]) -> float:
-        """计算情感分数（简化版）"""
-        if not words:
-            return 0.0
-        
-        # 简单的情感词典
-        positive_words = {'好', '棒', '优秀', '完美', '喜欢', '爱', '开心', '高兴', '满意', '成功'}
-        negative_words = {'坏', '差', '糟糕', '讨厌', '恨', '难过', '失望', '失败', '问题', '错误'}
-        
-        positive_count = sum(1 for word in words if word in positive_words)
-        negative_count = sum(1 for word in words if word in negative_words)
+    def _calculate_enhanced_similarity(self, features1: Dict, features2: Dict, threshold: float = 0.0) -> float:
+        """
+        计算增强的相似度
         
-        if positive_count + negative_count == 0:
-            return 0.0
-        
-        return (positive_count - negative_count) / (positive_count + negative_count)
-    
-    def _calculate_enhanced_similarity(self, features1: Dict, features2: Dict) -> float:
-        """计算增强的相似度"""
+        指定 threshold 时，若剩余特征全部满分也无法达到阈值则提前返回0
+        """
         try:
-            # 定义特征权重
-            weights = {
-                'word_count': 0.08,
-                'char_count': 0.05,
-                'unique_words': 0.08,
-                'avg_word_length': 0.05,
-                'common_words': 0.30,
-                'word_frequency': 0.20,
-                'vocabulary_richness': 0.08,
-                'sentence_count': 0.03,
-                'paragraph_count': 0.03,
-                'has_numbers': 0.02,
-                'has_urls': 0.02,
-                'has_emails': 0.02,
-                'has_phone': 0.02,
-                'chinese_ratio': 0.05,
-                'english_ratio': 0.05,
-                'digit_ratio': 0.03,
-                'sentiment_score': 0.08,
-                'has_time': 0.02,
-                'has_date': 0.02,
-                'semantic_keywords': 0.15,
-                'topic_words': 0.10,
-            }
-            
             total_similarity = 0.0
             total_weight = 0.0
             
-            for feature, weight in weights.items():
+            for feature, weight, remaining_weight in FEATURE_ORDER:
                 if feature in features1 and feature in features2:
                     similarity = self._calculate_feature_similarity(
                         features1[feature], features2[feature], feature
                     )
                     total_similarity += similarity * weight
                     total_weight += weight
+                
+                if threshold > 0 and (
+                    total_similarity + remaining_weight < threshold * (total_weight + remaining_weight)
+                ):
+                    return 0.0
             
             return total_similarity / total_weight if total_weight > 0 else 0.0
             
@@ -235,10 +391,10 @@ class SimilarityServiceSimple:
     def _calculate_feature_similarity(self, val1: Any, val2: Any, feature: str) -> float:
         """计算单个特征的相似度"""
         try:
-            if feature in ['common_words', 'word_frequency']:
+            if feature in DICT_FEATURES:
                 # 字典类型特征
                 return self._calculate_dict_similarity(val1, val2)
-            elif feature in ['semantic_keywords', 'topic_words']:
+            elif feature in PAIR_LIST_FEATURES:
                 # 列表类型特征（转换为字典）
                 dict1 = dict(val1) if isinstance(val1, list) else val1
                 dict2 = dict(val2) if isinstance(val2, list) else val2
@@ -261,31 +417,25 @@ class SimilarityServiceSimple:
         if not dict1 or not dict2:
             return 0.0
         
-        keys1 = set(dict1.keys())
-        keys2 = set(dict2.keys())
+        keys1 = dict1.keys()
+        keys2 = dict2.keys()
         
-        intersection = keys1.intersection(keys2)
-        union = keys1.union(keys2)
+        intersection = keys1 & keys2
+        union_size = len(keys1) + len(keys2) - len(intersection)
         
-        if not union:
+        if not union_size:
             return 0.0
         
         # 基础Jaccard相似度
-        jaccard = len(intersection) / len(union)
+        jaccard = len(intersection) / union_size
         
-        # 考虑值的相似度
+        # 考虑值的相似度（这里的值都是词频/得分等数值）
         value_similarity = 0.0
         for key in intersection:
             val1 = dict1[key]
             val2 = dict2[key]
-            if isinstance(val1, (int, float)) and isinstance(val2, (int, float)):
-                if val1 == 0 and val2 == 0:
-                    value_similarity += 1.0
-                else:
-                    max_val = max(abs(val1), abs(val2))
-                    value_similarity += 1.0 - abs(val1 - val2) / max_val if max_val > 0 else 0
-        else:
-                value_similarity += 1.0 if val1 == val2 else 0.0
+            max_val = max(abs(val1), abs(val2))
+            value_similarity += 1.0 if max_val == 0 else 1.0 - abs(val1 - val2) / max_val
         
         if intersection:
             value_similarity /= len(intersection)
@@ -324,15 +474,23 @@ class SimilarityServiceSimple:
             logger.warning(f"AI相似度检测失败: {e}")
             return []
     
+    @property
+    def _metadata_file(self) -> str:
+        return os.path.join(self.index_path, 'metadata.json')
+    
+    @property
+    def _records_file(self) -> str:
+        return os.path.join(self.index_path, 'records.jsonl')
+    
     def load_or_create_index(self):
         """加载或创建索引"""
         os.makedirs(self.index_path, exist_ok=True)
-        metadata_file = os.path.join(self.index_path, 'metadata.json')
+        metadata_file = self._metadata_file
         
         if os.path.exists(metadata_file):
             try:
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    self.document_metadata = json.load(f)
+                with open(metadata_file, 'rb') as f:
+                    self.document_metadata = _loads(f.read())
                 logger.info(f"已加载相似度索引，包含 {len(self.document_metadata)} 个文档")
             except Exception as e:
                 logger.error(f"加载索引失败: {e}")
@@ -340,30 +498,143 @@ class SimilarityServiceSimple:
         else:
             self.document_metadata = {}
             logger.info("创建新的相似度索引")
+        
+        self._replay_records()
+        self._postings = None
+    
+    def _build_postings(self) -> Dict[str, set]:
+        """根据当前全部文档构建倒排索引，调用方持有 _index_lock"""
+        postings = defaultdict(set)
+        for doc_id, doc_data in self.document_metadata.items():
+            for word in doc_data.get('features', {}).get('common_words', ()):
+                postings[word].add(doc_id)
+        return postings
+    
+    def _index_postings(self, doc_id: str, features: Dict):
+        """将单个文档的高频词加入倒排索引，倒排索引尚未构建时跳过"""
+        if self._postings is None:
+            return
+        for word in features.get('common_words', ()):
+            self._postings[word].add(doc_id)
+    
+    def _candidate_documents(self, query_features: Dict, threshold: float) -> Optional[set]:
+        """
+        返回与查询至少共享一个高频词的文档ID集合
+        
+        只对高阈值查询有效：阈值高于 NON_CANDIDATE_MAX_SCORE（约0.8，
+        非候选文档不可能达到）时才筛选，保证结果与全量计算一致。
+        默认阈值（0.1~0.3）下直接返回None，也不会构建倒排索引；
+        第一次出现高阈值查询时才构建，之后随新增文档增量维护
+        """
+        query_words = query_features.get('common_words')
+        if not query_words or threshold <= NON_CANDIDATE_MAX_SCORE:
+            return None
+        
+        postings = self._postings
+        if postings is None:
+            with self._index_lock:
+                if self._postings is None:
+                    self._postings = self._build_postings()
+                postings = self._postings
+        return set().union(*(postings.get(word, ()) for word in query_words))
+    
+    def _replay_records(self):
+        """回放追加日志中尚未合并的记录，同一文档以最后一条为准"""
+        records_file = self._records_file
+        if not os.path.exists(records_file):
+            return
+        
+        count = 0
+        with open(records_file, 'rb') as f:
+            for line in f:
+                try:
+                    self.document_metadata.update(_loads(line))
+                    count += 1
+                except ValueError:
+                    # 进程崩溃时最后一行可能只写了一半
+                    logger.warning("跳过无法解析的索引日志记录")
+        self._pending_records = count
+        if count:
+            logger.info(f"已回放 {count} 条索引日志记录")
+    
+    def _append_records(self, entries: Dict[str, Dict]):
+        """将文档逐条追加写入日志，不重写整个索引文件"""
+        data = b''.join(_dumps({doc_id: entry}) + b'\n' for doc_id, entry in entries.items())
+        with self._save_lock:
+            with open(self._records_file, 'ab') as f:
+                f.write(data)
+            self._pending_records += len(entries)
+            need_compact = self._pending_records >= self.COMPACT_RECORDS
+        if need_compact:
+            self.compact()
+    
+    def _build_document_entry(self, content: str, metadata: Dict = None,
+                              features: Dict = None, content_key: str = None) -> Optional[Dict]:
+        """
+        提取特征并构造文档索引条目，无法提取特征时返回None
+        
+        features 为已提取好的特征（批量提取时传入），为空时在此提取；
+        条目中记录内容摘要，重建索引时内容未变的文档可直接复用特征
+        """
+        content_key = content_key or _content_key(content)
+        if features is None:
+            features = _compute_text_features(content)
+        if not features:
+            return None
+        
+        return {
+            'content_preview': content[:self.PREVIEW_LENGTH],
+            'content_key': content_key,
+            'feature_version': FEATURE_VERSION,
+            'features': self._quantize_features(features),
+            'metadata': metadata or {},
+            'created_at': timezone.now().isoformat()
+        }
+    
+    def _quantize_features(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将浮点特征按 FEATURE_SIGNIFICANT_DIGITS 位有效数字取整，返回新的特征字典
+        
+        不按固定小数位取整：长文档的词频远小于 1e-4，按小数位取整会变成0
+        """
+        spec = f'.{self.FEATURE_SIGNIFICANT_DIGITS}g'
+        quantized = {}
+        for feature, value in features.items():
+            if isinstance(value, float):
+                value = float(format(value, spec))
+            elif feature in DICT_FEATURES:
+                value = {
+                    key: float(format(val, spec)) if isinstance(val, float) else val
+                    for key, val in value.items()
+                }
+            elif feature in PAIR_LIST_FEATURES:
+                value = [(key, float(format(score, spec))) for key, score in value]
+            quantized[feature] = value
+        return quantized
+    
+    def _commit_entries(self, entries: Dict[str, Dict]):
+        """将新条目写入内存索引，并追加写入磁盘日志"""
+        with self._index_lock:
+            self.document_metadata.update(entries)
+            for doc_id, entry in entries.items():
+                self._index_postings(doc_id, entry['features'])
+            if self._rebuild_added is not None:
+                self._rebuild_added.update(entries)
+            self._cache_version += 1
+        
+        # 所有记录一次追加写入磁盘日志
+        self._append_records(entries)
     
     def add_document(self, doc_id: str, content: str, metadata: Dict = None) -> bool:
         """添加文档到索引"""
         try:
             # 提取增强特征
-            features = self._extract_text_features(content)
-            if not features:
+            entry = self._build_document_entry(content, metadata)
+            if entry is None:
                 logger.warning(f"无法提取文档 {doc_id} 的特征")
                 return False
             
-            # 保存文档元数据
-            self.document_metadata[doc_id] = {
-                'content_preview': content[:500],
-                'features': features,
-                'metadata': metadata or {},
-                'created_at': timezone.now().isoformat()
-            }
-            
-            # 保存到Django缓存
-            cache_key = f"doc_features:{doc_id}"
-            cache.set(cache_key, features, timeout=3600)
-            
-            # 保存到磁盘
-            self.save_index()
+            self._commit_entries({doc_id: entry})
             
             logger.info(f"文档 {doc_id} 已添加到清理版相似度索引")
             return True
@@ -372,32 +643,225 @@ class SimilarityServiceSimple:
             logger.error(f"添加文档失败: {e}")
             return False
     
+    def _create_feature_pool(self) -> Optional[ProcessPoolExecutor]:
+        """
+        创建提取特征用的进程池，打包运行或无法创建时返回None
+        
+        使用 spawn 启动子进程：调用方在多线程的Web服务进程中，
+        fork 可能复制其他线程持有的锁（日志、缓存锁）导致子进程死锁
+        """
+        if getattr(sys, 'frozen', False):
+            return None
+        try:
+            return ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        except Exception as e:
+            logger.warning(f"创建特征提取进程池失败，改为逐个提取: {e}")
+            return None
+    
+    def _extract_features_batch(self, contents: List[str],
+                                executor: ProcessPoolExecutor = None) -> List[Dict[str, Any]]:
+        """
+        批量提取文本特征，结果顺序与 contents 一致
+        
+        传入进程池且文档较多时并行提取；否则或进程池出错时逐个提取
+        """
+        if executor is not None and len(contents) >= self.PARALLEL_MIN_DOCS:
+            try:
+                return list(executor.map(_compute_text_features, contents, chunksize=8))
+            except Exception as e:
+                logger.warning(f"多进程提取特征失败，改为逐个提取: {e}")
+        
+        return [_compute_text_features(content) for content in contents]
+    
+    def add_documents(self, items: List[Tuple[str, str, Dict]]) -> List[str]:
+        """
+        批量添加文档到索引
+        
+        Args:
+            items: (doc_id, content, metadata) 列表
+        
+        Returns:
+            成功加入索引的文档ID列表
+        """
+        try:
+            executor = self._create_feature_pool() if len(items) >= self.PARALLEL_MIN_DOCS else None
+            try:
+                features_list = self._extract_features_batch(
+                    [content for _, content, _ in items], executor
+                )
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            
+            entries = {}
+            for (doc_id, content, metadata), features in zip(items, features_list):
+                entry = self._build_document_entry(content, metadata, features)
+                if entry is None:
+                    logger.warning(f"无法提取文档 {doc_id} 的特征")
+                    continue
+                entries[doc_id] = entry
+            
+            if not entries:
+                return []
+            
+            self._commit_entries(entries)
+            
+            logger.info(f"{len(entries)} 个文档已批量添加到清理版相似度索引")
+            return list(entries)
+            
+        except Exception as e:
+            logger.error(f"批量添加文档失败: {e}")
+            return []
+    
+    def rebuild_index_from_database(self) -> int:
+        """
+        从数据库重建索引
+        
+        先为所有文本文档提取特征，最后整体替换索引并只写盘一次，
+        不逐个调用 add_document（每次都会重写整个索引文件）。
+        重建期间通过 add_document 新增的文档会合并进重建结果；
+        完成后为实际加入索引的数据库记录设置 is_indexed
+        
+        Returns:
+            成功加入索引的文档数量
+        """
+        with self._rebuild_lock:
+            # 在读取数据库之前开始记录新增文档，之后新增的文档不会丢失
+            with self._index_lock:
+                self._rebuild_added = {}
+            try:
+                return self._rebuild_index()
+            finally:
+                with self._index_lock:
+                    self._rebuild_added = None
+    
+    def _rebuild_index(self) -> int:
+        """执行索引重建，调用方持有 _rebuild_lock"""
+        from .models import FileSave
+        
+        documents = {}
+        # 逐批读取，避免一次性把所有 content_data 载入内存；过大的文档不参与索引
+        file_rows = FileSave.objects.filter(
+            content_type__in=['text/markdown', 'text/plain'],
+            file_size__lte=self.MAX_INDEX_FILE_SIZE
+        ).values('id', 'filename', 'file_path', 'content_data', 'created_at').iterator(
+            chunk_size=self.REBUILD_BATCH_SIZE
+        )
+        
+        # 现有索引中按内容摘要记录的特征，内容未变且特征版本一致的文档无需重新提取
+        known_features = {
+            entry['content_key']: entry['features']
+            for entry in self.document_metadata.values()
+            if 'content_key' in entry and entry.get('feature_version') == FEATURE_VERSION
+        }
+        reused_count = 0
+        # 实际加入索引的数据库记录ID，跳过的过大或无法解码的文档不在其中
+        indexed_ids = []
+        batch = []
+        # 整个重建过程共用一个进程池，首次需要并行提取时才创建
+        executor = None
+        
+        def flush_batch():
+            nonlocal reused_count, executor
+            keys = [_content_key(content) for _, content in batch]
+            
+            # 只对新增或内容有变化的文档整批并行提取特征
+            pending = [i for i, key in enumerate(keys) if key not in known_features]
+            if executor is None and len(pending) >= self.PARALLEL_MIN_DOCS:
+                executor = self._create_feature_pool()
+            extracted = self._extract_features_batch([batch[i][1] for i in pending], executor)
+            features_list = [known_features.get(key) for key in keys]
+            for i, features in zip(pending, extracted):
+                features_list[i] = features
+            reused_count += len(batch) - len(pending)
+            
+            for (row, content), key, features in zip(batch, keys, features_list):
+                entry = self._build_document_entry(content, {
+                    'filename': row['filename'],
+                    'file_path': row['file_path'],
+                    'created_at': row['created_at'].isoformat()
+                }, features, key)
+                if entry is None:
+                    logger.warning(f"无法提取文档 {row['id']} 的特征")
+                    continue
+                
+                documents[str(row['id'])] = entry
+                indexed_ids.append(row['id'])
+            batch.clear()
+        
+        try:
+            for row in file_rows:
+                try:
+                    content = base64.b64decode(row['content_data']).decode('utf-8')
+                except Exception as e:
+                    logger.warning(f"解码文档 {row['id']} 失败，跳过: {e}")
+                    continue
+                
+                batch.append((row, content))
+                if len(batch) >= self.REBUILD_BATCH_SIZE:
+                    flush_batch()
+            
+            if batch:
+                flush_batch()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        with self._index_lock:
+            # 合并重建期间新增的文档，再整体替换
+            documents.update(self._rebuild_added)
+            self._rebuild_added = None
+            self.document_metadata = documents
+            # 倒排索引在下次高阈值查询时按新索引重新构建
+            self._postings = None
+            self._cache_version += 1
+        self.save_index()
+        
+        # 只为实际加入索引的文档更新索引标记，分批避免 SQL 参数过多
+        for start in range(0, len(indexed_ids), self.REBUILD_BATCH_SIZE):
+            FileSave.objects.filter(
+                id__in=indexed_ids[start:start + self.REBUILD_BATCH_SIZE]
+            ).update(is_indexed=True)
+        
+        logger.info(f"相似度索引重建完成，包含 {len(documents)} 个文档，其中 {reused_count} 个复用已有特征")
+        return len(documents)
+    
+    def _result_cache_key(self, content_key: str, top_k: int, threshold: float) -> str:
+        """相似度结果的缓存键，包含索引版本和查询参数"""
+        return f"similarity:{self._cache_version}:{top_k}:{threshold}:{content_key}"
+    
     def find_similar_documents(self, query_content: str, top_k: int = 5, threshold: float = 0.3) -> List[Dict]:
         """查找相似文档"""
         try:
-            # 检查缓存
-            content_hash = hashlib.md5(query_content.encode()).hexdigest()
-            cache_key = f"similarity:{content_hash}"
+            # 内容摘要只计算一次，结果缓存和特征缓存共用
+            content_key = _content_key(query_content)
+            cache_key = self._result_cache_key(content_key, top_k, threshold)
             cached_result = cache.get(cache_key)
             if cached_result:
                 logger.info("使用缓存的相似度检测结果")
                 return cached_result
             
-            # 优先尝试AI检测（如果可用）
-            if self.ai_available:
-                ai_results = self._try_ai_similarity(query_content, top_k, threshold)
-                if ai_results:
-                    logger.info("使用AI相似度检测")
-                    return ai_results
-            
-            # 使用增强基础算法
-            return self._find_similar_enhanced(query_content, top_k, threshold)
+            return self._find_similar_uncached(query_content, top_k, threshold, cache_key, content_key)
                 
         except Exception as e:
             logger.error(f"搜索相似文档失败: {e}")
             return []
     
-    def _find_similar_enhanced(self, query_content: str, top_k: int, threshold: float) -> List[Dict]:
+    def _find_similar_uncached(self, query_content: str, top_k: int, threshold: float,
+                               cache_key: str, content_key: str) -> List[Dict]:
+        """未命中缓存时执行检测，cache_key 和 content_key 由调用方计算好传入"""
+        # 优先尝试AI检测（如果可用）
+        if self.ai_available:
+            ai_results = self._try_ai_similarity(query_content, top_k, threshold)
+            if ai_results:
+                logger.info("使用AI相似度检测")
+                return ai_results
+        
+        # 使用增强基础算法
+        return self._find_similar_enhanced(query_content, top_k, threshold, cache_key, content_key)
+    
+    def _find_similar_enhanced(self, query_content: str, top_k: int, threshold: float,
+                               cache_key: str, content_key: str = None) -> List[Dict]:
         """使用增强算法查找相似文档"""
         try:
             if not self.document_metadata:
@@ -405,32 +869,46 @@ class SimilarityServiceSimple:
                 return []
             
             # 提取查询特征
-            query_features = self._extract_text_features(query_content)
+            query_features = self._extract_query_features(query_content, content_key)
             if not query_features:
                 logger.warning("无法提取查询特征")
                 return []
             
-            # 计算相似度
+            # 查询端的 (词, 分数) 列表只转换一次，不在每个文档比较时重复转换
+            for feature in PAIR_LIST_FEATURES:
+                if feature in query_features:
+                    query_features[feature] = dict(query_features[feature])
+            
+            # 阈值足够高时跳过不可能达到阈值的非候选文档
             similarities = []
+            candidates = self._candidate_documents(query_features, threshold)
             for doc_id, doc_data in self.document_metadata.items():
                 doc_features = doc_data.get('features', {})
-                similarity = self._calculate_enhanced_similarity(query_features, doc_features)
+                # 按原顺序遍历，相似度相同时结果顺序与全量计算一致；
+                # 缺少 common_words 的旧条目不在倒排索引中，仍需完整计算
+                if (candidates is not None and doc_id not in candidates
+                        and 'common_words' in doc_features):
+                    continue
+                similarity = self._calculate_enhanced_similarity(query_features, doc_features, threshold)
                 
                 if similarity >= threshold:
-                    similarities.append({
-                        'doc_id': doc_id,
-                        'similarity_score': similarity,
-                        'content_preview': doc_data.get('content_preview', ''),
-                        'metadata': doc_data.get('metadata', {}),
-                        'created_at': doc_data.get('created_at', '')
-                    })
+                    similarities.append((similarity, doc_id, doc_data))
             
-            # 按相似度排序
-            similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
-            results = similarities[:top_k]
+            # 只取相似度最高的 top_k 个，无需对全部结果排序
+            results = [
+                {
+                    'doc_id': doc_id,
+                    'similarity_score': similarity,
+                    'content_preview': doc_data.get('content_preview', ''),
+                    'metadata': doc_data.get('metadata', {}),
+                    'created_at': doc_data.get('created_at', '')
+                }
+                for similarity, doc_id, doc_data in heapq.nlargest(
+                    top_k, similarities, key=lambda item: item[0]
+                )
+            ]
             
             # 缓存结果
-            cache_key = f"similarity:{hashlib.md5(query_content.encode()).hexdigest()}"
             cache.set(cache_key, results, timeout=1800)
             
             logger.info(f"找到 {len(results)} 个相似文档（清理版基础算法）")
@@ -441,16 +919,31 @@ class SimilarityServiceSimple:
             return []
     
     def save_index(self):
-        """保存索引到磁盘"""
+        """保存完整索引到磁盘，并清空已合并的追加日志"""
         try:
-            metadata_file = os.path.join(self.index_path, 'metadata.json')
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.document_metadata, f, ensure_ascii=False, indent=2)
+            metadata_file = self._metadata_file
+            # 先写临时文件再原子替换，写盘中途崩溃不会损坏已有索引
+            tmp_file = f"{metadata_file}.tmp"
+            with self._save_lock:
+                # 浅拷贝一份，避免写盘期间其他线程新增文档
+                data = _dumps(dict(self.document_metadata))
+                with open(tmp_file, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_file, metadata_file)
+                
+                # 日志中的记录都已包含在 metadata.json 中
+                if os.path.exists(self._records_file):
+                    os.remove(self._records_file)
+                self._pending_records = 0
             
             logger.info("清理版相似度索引已保存到磁盘")
         except Exception as e:
             logger.error(f"保存索引失败: {e}")
     
+    def compact(self):
+        """将追加日志合并到 metadata.json"""
+        self.save_index()
+    
     def get_index_stats(self) -> Dict:
         """获取索引统计信息"""
         return {
@@ -469,7 +962,6 @@ class SimilarityServiceSimple:
                 'Text Statistics',
                 'Word Frequency Analysis',
                 'Semantic Keywords',
-                'Topic Words',
                 'Language Detection',
                 'Structure Analysis',
                 'Sentiment Analysis'
@@ -478,5 +970,20 @@ class SimilarityServiceSimple:
             'ai_interface_available': self.ai_available
         }
 
-# 全局实例
-similarity_service_simple = SimilarityServiceSimple()
+# 全局实例，首次使用时才创建，避免导入模块时就加载索引
+_similarity_service = None
+_similarity_service_lock = threading.Lock()
+
+
+def get_similarity_service() -> Optional[SimilarityServiceSimple]:
+    """获取相似度服务实例，初始化失败时返回None"""
+    global _similarity_service
+    if _similarity_service is None:
+        # 多线程同时首次访问时只创建一个实例
+        with _similarity_service_lock:
+            if _similarity_service is None:
+                try:
+                    _similarity_service = SimilarityServiceSimple()
+                except Exception as e:
+                    logger.error(f"相似度服务初始化失败: {e}")
+    return _similarity_service
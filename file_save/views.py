@@ -4,13 +4,21 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q, Count
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q, Count, Sum, Avg
 from django.utils import timezone
 from datetime import timedelta
 import base64
 import os
+import sys
 import logging
-from .models import FileSave, FilePath, FileSaveHistory
+import subprocess
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from .models import FileSave, FilePath, FileSaveHistory, IMAGE_EXTENSIONS, DOCUMENT_EXTENSIONS
 from .serializers import (
     FileSaveSerializer, 
     FileSaveCreateSerializer, 
@@ -20,10 +28,91 @@ from .serializers import (
     FilePathListSerializer
 )
 # 启用简单相似度服务（不依赖numpy，适合PyInstaller打包）
-from .similarity_service_simple import similarity_service_simple
+from .similarity_service_simple import get_similarity_service
 
 logger = logging.getLogger(__name__)
 
+# 相似度状态接口通常被前端高频轮询，短时缓存结果以限制对索引和数据库的压力
+SIMILARITY_STATS_CACHE_KEY = 'similarity:index_stats'
+SIMILARITY_DEBUG_CACHE_KEY = 'similarity:debug'
+SIMILARITY_STATUS_CACHE_TIMEOUT = 3
+
+
+def get_cached_index_stats():
+    """获取相似度索引统计（短时缓存）"""
+    stats = cache.get(SIMILARITY_STATS_CACHE_KEY)
+    if stats is None:
+        stats = get_similarity_service().get_index_stats()
+        cache.set(SIMILARITY_STATS_CACHE_KEY, stats, SIMILARITY_STATUS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_similarity_status_cache():
+    """索引变化后清除状态缓存"""
+    cache.delete_many([SIMILARITY_STATS_CACHE_KEY, SIMILARITY_DEBUG_CACHE_KEY])
+
+
+# 重建索引在后台单线程执行，同一时间只允许一个重建任务
+_rebuild_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similarity-rebuild')
+_rebuild_lock = threading.Lock()
+_rebuild_running = threading.Event()
+_rebuild_task = {'id': None, 'future': None}
+
+
+def _run_rebuild_index():
+    """后台执行索引重建"""
+    try:
+        # 重建时只为实际加入索引的文档更新索引标记
+        count = get_similarity_service().rebuild_index_from_database()
+        invalidate_similarity_status_cache()
+        
+        logger.info(f"后台索引重建完成，处理了 {count} 个文档")
+        return count
+    except Exception as e:
+        logger.error(f"后台重建索引失败: {e}")
+        raise
+    finally:
+        # 后台线程的数据库连接不会被请求周期回收，需要手动关闭
+        connection.close()
+        _rebuild_running.clear()
+
+
+def submit_rebuild_index():
+    """
+    提交后台索引重建任务
+    
+    Returns:
+        (任务ID, 是否新提交)；已有任务在运行时返回正在运行的任务ID
+    """
+    with _rebuild_lock:
+        if _rebuild_running.is_set():
+            return _rebuild_task['id'], False
+        
+        _rebuild_running.set()
+        _rebuild_task['id'] = uuid.uuid4().hex
+        _rebuild_task['future'] = _rebuild_executor.submit(_run_rebuild_index)
+        return _rebuild_task['id'], True
+
+
+def get_rebuild_status(task_id):
+    """获取后台索引重建任务状态，任务不存在时返回None"""
+    if not task_id or task_id != _rebuild_task['id']:
+        return None
+    
+    future = _rebuild_task['future']
+    if not future.done():
+        return {'task_id': task_id, 'status': 'running'}
+    
+    error = future.exception()
+    if error is not None:
+        return {'task_id': task_id, 'status': 'failed', 'error': str(error)}
+    
+    return {
+        'task_id': task_id,
+        'status': 'completed',
+        'processed_documents': future.result()
+    }
+
 
 class FileSaveViewSet(viewsets.ModelViewSet):
     """文件保存视图集"""
@@ -33,6 +122,11 @@ class FileSaveViewSet(viewsets.ModelViewSet):
     search_fields = ['filename', 'file_path']
     ordering_fields = ['created_at', 'file_size', 'filename']
     ordering = ['-created_at']
+    # 列表类接口只读取 FileSaveListSerializer 用到的列，跳过体积很大的 content_data
+    list_only_fields = (
+        'id', 'filename', 'file_path', 'file_size', 'file_extension',
+        'content_type', 'created_at'
+    )
     
     def get_serializer_class(self):
         """根据动作返回不同的序列化器"""
@@ -46,16 +140,19 @@ class FileSaveViewSet(viewsets.ModelViewSet):
         """获取查询集"""
         queryset = super().get_queryset()
         
+        if self.action in ('list', 'search'):
+            queryset = queryset.only(*self.list_only_fields)
+        
         # 按文件类型过滤
         file_type = self.request.query_params.get('file_type')
         if file_type:
             if file_type == 'image':
                 queryset = queryset.filter(
-                    file_extension__in=['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'svg']
+                    file_extension__in=IMAGE_EXTENSIONS
                 )
             elif file_type == 'document':
                 queryset = queryset.filter(
-                    file_extension__in=['pdf', 'doc', 'docx', 'txt', 'rtf', 'odt']
+                    file_extension__in=DOCUMENT_EXTENSIONS
                 )
         
         # 按文件大小过滤
@@ -87,12 +184,12 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                         
                         if content_data:
                             # 解码base64内容
-                            import base64
                             content = base64.b64decode(content_data).decode('utf-8')
                             
                             # 添加到相似度索引（如果服务可用）
-                            if similarity_service_simple:
-                                similarity_service_simple.add_document(
+                            similarity_service = get_similarity_service()
+                            if similarity_service:
+                                similarity_service.add_document(
                                     doc_id=str(file_id),
                                     content=content,
                                     metadata={
@@ -102,9 +199,8 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                                     }
                                 )
                             
-                            # 更新索引标记
-                            file_obj.is_indexed = True
-                            file_obj.save()
+                            # 更新索引标记（只更新该字段，不重写 content_data）
+                            FileSave.objects.filter(id=file_id).update(is_indexed=True)
                             
                             logger.info(f"文件 {file_id} 已添加到相似度索引")
                             
@@ -124,8 +220,6 @@ class FileSaveViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """获取文件保存统计信息"""
-        from django.db.models import Count, Sum, Avg
-        
         queryset = self.get_queryset()
         
         # 基础统计
@@ -145,8 +239,6 @@ class FileSaveViewSet(viewsets.ModelViewSet):
         ).order_by('-count')
         
         # 最近文件
-        from django.utils import timezone
-        from datetime import timedelta
         recent_files = queryset.filter(
             created_at__gte=timezone.now() - timedelta(days=7)
         ).count()
@@ -188,10 +280,6 @@ class FileSaveViewSet(viewsets.ModelViewSet):
             return manager.check_pandoc_available()
         except ImportError:
             # 如果pandoc_manager不可用，使用简单检查
-            import sys
-            import os
-            import subprocess
-            
             # 如果是PyInstaller打包的环境
             if getattr(sys, 'frozen', False):
                 # 获取可执行文件所在目录
@@ -227,11 +315,6 @@ class FileSaveViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def convert(self, request, pk=None):
         """文件格式转换"""
-        import os
-        import base64
-        import subprocess
-        import tempfile
-        
         file_save = self.get_object()
         target_format = request.data.get('target_format')
         
@@ -360,27 +443,49 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        similarity_service = get_similarity_service()
         results = []
+        # 需要加入相似度索引的文本文件，全部保存后一次批量加入
+        index_items = []
         for file in files:
             # 处理每个文件
+            raw_content = file.read()
             file_data = {
                 'filename': file.name,
                 'file_path': f'/uploads/{file.name}',
                 'file_size': file.size,
                 'content_type': file.content_type,
-                'content_data': 'base64_encoded_content'  # 实际应该编码文件内容
+                'content_data': base64.b64encode(raw_content).decode('ascii')
             }
             
             serializer = FileSaveCreateSerializer(data=file_data)
             if serializer.is_valid():
                 file_save = serializer.save()
                 results.append(FileSaveSerializer(file_save).data)
+                
+                # 与重建索引相同：只索引不超过大小限制的文本文件
+                if (similarity_service
+                        and file_save.content_type in ('text/markdown', 'text/plain')
+                        and len(raw_content) <= similarity_service.MAX_INDEX_FILE_SIZE):
+                    try:
+                        index_items.append((str(file_save.id), raw_content.decode('utf-8'), {
+                            'filename': file_save.filename,
+                            'file_path': file_save.file_path,
+                            'created_at': file_save.created_at.isoformat()
+                        }))
+                    except UnicodeDecodeError:
+                        logger.warning(f"文件 {file_save.id} 不是UTF-8文本，不加入相似度索引")
             else:
                 results.append({
                     'filename': file.name,
                     'error': serializer.errors
                 })
         
+        if index_items:
+            indexed_ids = similarity_service.add_documents(index_items)
+            # 只为实际加入索引的文件更新索引标记
+            FileSave.objects.filter(id__in=indexed_ids).update(is_indexed=True)
+        
         return Response({
             'message': f'批量上传完成，共处理 {len(files)} 个文件',
             'results': results
@@ -401,10 +506,10 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # 查找相似文件（如果服务可用）
-            # similarity_service_simple 已经在模块级别导入
-            if similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if similarity_service:
                 logger.info(f"开始查找相似文件，内容长度: {len(content)}, 阈值: {threshold}")
-                similar_docs = similarity_service_simple.find_similar_documents(
+                similar_docs = similarity_service.find_similar_documents(
                     query_content=content,
                     top_k=top_k,
                     threshold=threshold
@@ -415,23 +520,29 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                 logger.warning("相似度服务不可用")
                 similar_docs = []
             
-            # 获取完整文件信息
+            # 一次查询取出所有相似文件的完整信息
+            files_by_id = {
+                str(file_obj.id): file_obj
+                for file_obj in FileSave.objects.filter(
+                    id__in=[doc['doc_id'] for doc in similar_docs]
+                ).only('id', 'filename', 'file_path', 'file_size', 'created_at')
+            }
+            
             results = []
             for doc in similar_docs:
-                try:
-                    file_obj = FileSave.objects.get(id=doc['doc_id'])
-                    results.append({
-                        'id': file_obj.id,
-                        'filename': file_obj.filename,
-                        'file_path': file_obj.file_path,
-                        'file_size_mb': file_obj.file_size_mb,
-                        'created_at': file_obj.created_at.isoformat(),
-                        'similarity_score': doc['similarity_score'],
-                        'content_preview': doc['content_preview']
-                    })
-                except FileSave.DoesNotExist:
+                file_obj = files_by_id.get(str(doc['doc_id']))
+                if file_obj is None:
                     logger.warning(f"文件 {doc['doc_id']} 不存在，跳过")
                     continue
+                results.append({
+                    'id': file_obj.id,
+                    'filename': file_obj.filename,
+                    'file_path': file_obj.file_path,
+                    'file_size_mb': file_obj.file_size_mb,
+                    'created_at': file_obj.created_at.isoformat(),
+                    'similarity_score': doc['similarity_score'],
+                    'content_preview': doc['content_preview']
+                })
             
             return Response({
                 'success': True,
@@ -450,31 +561,30 @@ class FileSaveViewSet(viewsets.ModelViewSet):
     def similarity_debug(self, request):
         """相似度服务调试接口"""
         try:
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
             # 获取索引统计
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
-            stats = similarity_service_simple.get_index_stats()
-            
-            # 获取数据库中的文件数量
-            from .models import FileSave
-            total_files = FileSave.objects.count()
-            indexed_files = FileSave.objects.filter(is_indexed=True).count()
-            
-            return Response({
-                'success': True,
-                'data': {
+            data = cache.get(SIMILARITY_DEBUG_CACHE_KEY)
+            if data is None:
+                stats = get_cached_index_stats()
+                
+                # 获取数据库中的文件数量
+                total_files = FileSave.objects.count()
+                indexed_files = FileSave.objects.filter(is_indexed=True).count()
+                
+                data = {
                     'index_stats': stats,
                     'database_stats': {
                         'total_files': total_files,
@@ -482,6 +592,11 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                         'not_indexed_files': total_files - indexed_files
                     }
                 }
+                cache.set(SIMILARITY_DEBUG_CACHE_KEY, data, SIMILARITY_STATUS_CACHE_TIMEOUT)
+            
+            return Response({
+                'success': True,
+                'data': data
             })
         except Exception as e:
             logger.error(f"相似度调试失败: {e}")
@@ -494,15 +609,15 @@ class FileSaveViewSet(viewsets.ModelViewSet):
     def rebuild_similarity_index(self, request):
         """重建相似度索引"""
         try:
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
             # 重建索引
-            success_count = similarity_service_simple.rebuild_index_from_database()
+            success_count = similarity_service.rebuild_index_from_database()
             
             return Response({
                 'success': True,
@@ -551,9 +666,9 @@ class FileSaveViewSet(viewsets.ModelViewSet):
             
             # 将新文件添加到相似度索引（如果服务可用）
             if result['success']:
-                # similarity_service_simple 已经在模块级别导入
-                if similarity_service_simple:
-                    similarity_service_simple.add_document(
+                similarity_service = get_similarity_service()
+                if similarity_service:
+                    similarity_service.add_document(
                     doc_id=str(result['file_id']),
                     content=content,
                     metadata={
@@ -563,13 +678,8 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                     }
                 )
                 
-                # 更新索引标记
-                try:
-                    file_obj = FileSave.objects.get(id=result['file_id'])
-                    file_obj.is_indexed = True
-                    file_obj.save()
-                except FileSave.DoesNotExist:
-                    pass
+                # 更新索引标记（只更新该字段，不重写 content_data）
+                FileSave.objects.filter(id=result['file_id']).update(is_indexed=True)
             
             return Response(result)
             
@@ -674,24 +784,26 @@ class FileSaveViewSet(viewsets.ModelViewSet):
     def rebuild_similarity_index(self, request):
         """重建相似度索引"""
         try:
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
-            count = similarity_service_simple.rebuild_index_from_database()
-            
-            # 更新所有文档的索引标记
-            FileSave.objects.filter(
-                content_type__in=['text/markdown', 'text/plain']
-            ).update(is_indexed=True)
+            task_id, submitted = submit_rebuild_index()
+            if not submitted:
+                return Response({
+                    'success': False,
+                    'task_id': task_id,
+                    'message': '索引重建正在进行中，请稍后查询任务状态'
+                }, status=status.HTTP_409_CONFLICT)
             
             return Response({
                 'success': True,
-                'message': f'索引重建完成，处理了 {count} 个文档'
-            })
+                'task_id': task_id,
+                'message': '索引重建已在后台开始'
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             logger.error(f"重建索引失败: {e}")
             return Response({
@@ -699,18 +811,33 @@ class FileSaveViewSet(viewsets.ModelViewSet):
                 'message': f'重建索引失败: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['get'])
+    def rebuild_status(self, request):
+        """查询后台索引重建任务状态"""
+        task_status = get_rebuild_status(request.query_params.get('task_id'))
+        if task_status is None:
+            return Response({
+                'success': False,
+                'message': '任务不存在'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'success': True,
+            'data': task_status
+        })
+    
     @action(detail=False, methods=['get'])
     def similarity_index_stats(self, request):
         """获取相似度索引统计信息"""
         try:
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
-            stats = similarity_service_simple.get_index_stats()
+            stats = get_cached_index_stats()
             return Response({
                 'success': True,
                 'data': stats
@@ -928,9 +1055,9 @@ class FilePathViewSet(viewsets.ModelViewSet):
             
             # 将新文件添加到相似度索引（如果服务可用）
             if result['success']:
-                # similarity_service_simple 已经在模块级别导入
-                if similarity_service_simple:
-                    similarity_service_simple.add_document(
+                similarity_service = get_similarity_service()
+                if similarity_service:
+                    similarity_service.add_document(
                     doc_id=str(result['file_id']),
                     content=content,
                     metadata={
@@ -940,13 +1067,8 @@ class FilePathViewSet(viewsets.ModelViewSet):
                     }
                 )
                 
-                # 更新索引标记
-                try:
-                    file_obj = FileSave.objects.get(id=result['file_id'])
-                    file_obj.is_indexed = True
-                    file_obj.save()
-                except FileSave.DoesNotExist:
-                    pass
+                # 更新索引标记（只更新该字段，不重写 content_data）
+                FileSave.objects.filter(id=result['file_id']).update(is_indexed=True)
             
             return Response(result)
             
@@ -1051,24 +1173,26 @@ class FilePathViewSet(viewsets.ModelViewSet):
     def rebuild_similarity_index(self, request):
         """重建相似度索引"""
         try:
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
-            count = similarity_service_simple.rebuild_index_from_database()
-            
-            # 更新所有文档的索引标记
-            FileSave.objects.filter(
-                content_type__in=['text/markdown', 'text/plain']
-            ).update(is_indexed=True)
+            task_id, submitted = submit_rebuild_index()
+            if not submitted:
+                return Response({
+                    'success': False,
+                    'task_id': task_id,
+                    'message': '索引重建正在进行中，请稍后查询任务状态'
+                }, status=status.HTTP_409_CONFLICT)
             
             return Response({
                 'success': True,
-                'message': f'索引重建完成，处理了 {count} 个文档'
-            })
+                'task_id': task_id,
+                'message': '索引重建已在后台开始'
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             logger.error(f"重建索引失败: {e}")
             return Response({
@@ -1080,14 +1204,14 @@ class FilePathViewSet(viewsets.ModelViewSet):
     def similarity_index_stats(self, request):
         """获取相似度索引统计信息"""
         try:
-            # similarity_service_simple 已经在模块级别导入
-            if not similarity_service_simple:
+            similarity_service = get_similarity_service()
+            if not similarity_service:
                 return Response({
                     'success': False,
                     'message': '相似度服务不可用'
                 })
             
-            stats = similarity_service_simple.get_index_stats()
+            stats = get_cached_index_stats()
             return Response({
                 'success': True,
                 'data': stats
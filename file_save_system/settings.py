@@ -278,6 +278,9 @@ CACHES = {
     }
 }
 
+# 批量写入配置：bulk_create 每批插入的行数，可通过环境变量调整
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 100))
+
 # 日志配置
 # 确定日志文件路径
 if getattr(sys, 'frozen', False) and 'PACKAGED_LOGS_DIR' in globals():